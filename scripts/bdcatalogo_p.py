@@ -7,42 +7,113 @@ Importa datos a catalogo_productos desde un Excel.
 Columnas esperadas en el Excel:
   SKU | MARCA | SKU INTERNO | MODELO | COSTO ACTUAL | INVENTARIO ACTUAL
 
+Carga:
+  Por defecto las filas se arman columna a columna (sin iterrows) y se envían con
+  COPY FROM STDIN en formato texto; --copy-format binary usa COPY binario.
+  --method values conserva el camino anterior (execute_values en páginas de 1000).
+
+Archivos grandes (--stream):
+  Lee la hoja con openpyxl en modo read_only (iter_rows(values_only=True)) y entrega
+  bloques de --chunk-rows filas directo al COPY, sin DataFrame ni lista completa de
+  tuplas: la memoria queda acotada aunque el archivo tenga 500k+ filas.
+
+Re-importación (--merge):
+  Carga la hoja en una tabla temporal (sin WAL) y aplica solo las diferencias en una
+  sentencia: SKUs nuevos se insertan y los existentes se actualizan únicamente si cambió
+  costo/stock/marca/nombre_producto (IS DISTINCT FROM). Si la hoja repite un SKU, gana
+  la última fila.
+
+Caché de importación (--cache):
+  Guarda en un SQLite local (--state, default .bdcatalogo_state.sqlite junto al Excel) el
+  digest del archivo y un digest por SKU de la última importación exitosa, por base destino.
+  Un archivo idéntico termina sin conectarse; uno modificado solo envía (vía --merge) las
+  filas cuyo digest cambió.
+
+Varios workbooks (uno por marca):
+  python bdcatalogo_p.py --file catalogos/ --merge          # carpeta
+  python bdcatalogo_p.py --file "catalogos/*.xlsx" --merge  # glob
+  Los archivos se leen en paralelo en un pool de procesos (--workers, como máximo uno por
+  archivo) y se cargan por un pool acotado de conexiones (--db-workers), cada uno en su propia
+  transacción: un archivo con error no revierte los demás. Al final se imprime un resumen por
+  archivo. Con --stream no se usa el pool de procesos: cada conexión lee su archivo por
+  bloques, y la memoria sigue acotada (--db-workers x --chunk-rows filas).
+
+Benchmark (dentro de una transacción que se revierte, no deja datos):
+  python bdcatalogo_p.py --file catalogo.xlsx --bench
+
 Requisitos:
   pip install pandas psycopg2-binary python-dotenv openpyxl
 """
 
 import argparse
+import glob
+import hashlib
+import itertools
 import os
+import sqlite3
 import sys
+import time
 
 import pandas as pd
 import psycopg2
 from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
+from openpyxl import load_workbook
+
+from pgcopy import CopyStream, encode_row, iter_binary, iter_text
+
+COLUMNS = ["sku", "marca", "sku_interno", "nombre_producto", "costo", "stock"]
+BINARY_KINDS = ["text", "text", "text", "text", "numeric", "int4"]
+COPY_BUFFER = 1 << 20
+CHUNK_ROWS = 10_000
+STATE_FILE = ".bdcatalogo_state.sqlite"
+EXCEL_GLOBS = ("*.xlsx", "*.xlsm", "*.xls")
+
+# Encabezado del Excel (en minúsculas, sin espacios extremos) -> columna de la tabla
+COLMAP = {
+    "sku": "sku",
+    "marca": "marca",
+    "sku interno": "sku_interno",
+    "modelo": "nombre_producto",
+    "costo actual": "costo",
+    "inventario actual": "stock",
+}
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Importar catálogo de productos")
-    parser.add_argument("--file", required=True, help="Ruta al archivo Excel")
+    parser.add_argument("--file", required=True,
+                        help="Ruta al archivo Excel, a una carpeta o un glob (ej. 'catalogos/*.xlsx')")
     parser.add_argument("--db", help="Cadena de conexión a Postgres (DATABASE_URL)")
+    parser.add_argument("--method", choices=["copy", "values"], default="copy",
+                        help="copy = COPY FROM STDIN (default); values = execute_values")
+    parser.add_argument("--copy-format", choices=["text", "binary"], default="text",
+                        help="Formato de COPY (default: text)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Lee el Excel en streaming (openpyxl read_only) con memoria acotada")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                        help=f"Filas por bloque en --stream (default: {CHUNK_ROWS})")
+    parser.add_argument("--merge", action="store_true",
+                        help="Inserta SKUs nuevos y actualiza solo los que cambiaron (vía tabla temporal)")
+    parser.add_argument("--cache", action="store_true",
+                        help="Omite archivos/filas sin cambios desde la última importación (implica --merge)")
+    parser.add_argument("--state", help=f"Archivo SQLite de la caché (default: {STATE_FILE} junto al Excel)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Con varios archivos y sin --stream: procesos que leen workbooks en paralelo (máx. uno por archivo)")
+    parser.add_argument("--db-workers", type=int, default=4,
+                        help="Con varios archivos: conexiones simultáneas del pool (default: 4)")
+    parser.add_argument("--bench", action="store_true",
+                        help="Compara execute_values vs COPY texto/binario y revierte todo")
     return parser.parse_args()
 
 
 def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     # Normalizar nombres de columnas
-    colmap = {
-        "sku": "sku",
-        "marca": "marca",
-        "sku interno": "sku_interno",
-        "modelo": "nombre_producto",
-        "costo actual": "costo",
-        "inventario actual": "stock",
-    }
-    df = df.rename(columns={c.lower().strip(): colmap.get(c.lower().strip(), c) for c in df.columns})
+    df = df.rename(columns={c: COLMAP.get(str(c).lower().strip(), c) for c in df.columns})
 
     # Validar columnas requeridas
-    required = ["sku", "marca", "sku_interno", "nombre_producto", "costo", "stock"]
-    missing = [c for c in required if c not in df.columns]
+    missing = [c for c in COLUMNS if c not in df.columns]
     if missing:
         raise ValueError(f"Faltan columnas en el Excel: {missing}")
 
@@ -58,9 +129,103 @@ def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def batch_insert(conn, rows):
-    sql = """
-    INSERT INTO catalogo_productos
+def _to_float(v):
+    if v is None or isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float)):
+        return None if v != v else float(v)  # NaN -> None
+    try:
+        return float(str(v).strip())
+    except ValueError:
+        return None
+
+
+def _to_int(v) -> int:
+    f = _to_float(v)
+    return 0 if f is None else int(f)
+
+
+def _to_text(v):
+    return None if v is None else str(v).strip()
+
+
+def read_excel_chunks(path: str, chunk_rows: int = CHUNK_ROWS):
+    """
+    Lector en streaming del Excel (primera hoja). Valida el encabezado de inmediato
+    con el mismo COLMAP que normalize_dataframe y devuelve un generador de listas de
+    hasta `chunk_rows` tuplas en el orden de COLUMNS. Las filas totalmente vacías se omiten.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    ws = wb.worksheets[0]
+    it = ws.iter_rows(values_only=True)
+    header = next(it, None) or ()
+    names = [COLMAP.get(str(c).lower().strip(), c) if c is not None else None for c in header]
+    missing = [c for c in COLUMNS if c not in names]
+    if missing:
+        wb.close()
+        raise ValueError(f"Faltan columnas en el Excel: {missing}")
+    i_sku, i_marca, i_int, i_nom, i_costo, i_stock = (names.index(c) for c in COLUMNS)
+
+    def chunks():
+        try:
+            chunk = []
+            for r in it:
+                if r is None or all(v is None for v in r):
+                    continue
+                r = r + (None,) * (len(names) - len(r))
+                chunk.append((
+                    _to_text(r[i_sku]),
+                    _to_text(r[i_marca]),
+                    _to_text(r[i_int]),
+                    _to_text(r[i_nom]),
+                    _to_float(r[i_costo]),
+                    _to_int(r[i_stock]),
+                ))
+                if len(chunk) >= chunk_rows:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        finally:
+            wb.close()
+
+    return chunks()
+
+
+def dataframe_rows(df: pd.DataFrame):
+    """
+    Tuplas (sku, marca, sku_interno, nombre_producto, costo, stock) armadas columna a
+    columna: un .tolist() por columna y zip, sin crear una Series por fila.
+    """
+    costo = df["costo"].astype(object).where(df["costo"].notna(), None)
+    return zip(
+        df["sku"].tolist(),
+        df["marca"].tolist(),
+        df["sku_interno"].tolist(),
+        df["nombre_producto"].tolist(),
+        costo.tolist(),
+        df["stock"].astype(int).tolist(),
+    )
+
+
+def iterrows_rows(df: pd.DataFrame):
+    """Camino anterior (una Series por fila); se conserva solo para --bench."""
+    return [
+        (
+            r["sku"],
+            r["marca"],
+            r["sku_interno"],
+            r["nombre_producto"],
+            None if pd.isna(r["costo"]) else float(r["costo"]),
+            int(r["stock"]),
+        )
+        for _, r in df.iterrows()
+    ]
+
+
+def batch_insert(conn, rows, table: str = "catalogo_productos"):
+    sql = f"""
+    INSERT INTO {table}
       (sku, marca, sku_interno, nombre_producto, costo, stock)
     VALUES %s
     """
@@ -68,6 +233,299 @@ def batch_insert(conn, rows):
         execute_values(cur, sql, rows, page_size=1000)
 
 
+def copy_insert(conn, rows, fmt: str = "text", table: str = "catalogo_productos") -> int:
+    """COPY FROM STDIN en streaming; devuelve el número de filas enviadas."""
+    cols = ", ".join(COLUMNS)
+    if fmt == "binary":
+        stream = CopyStream(iter_binary(rows, BINARY_KINDS))
+        sql = f"COPY {table} ({cols}) FROM STDIN WITH (FORMAT binary)"
+        extra = 2  # cabecera y trailer
+    else:
+        stream = CopyStream(iter_text(rows))
+        sql = f"COPY {table} ({cols}) FROM STDIN"
+        extra = 0
+    with conn.cursor() as cur:
+        cur.copy_expert(sql, stream, size=COPY_BUFFER)
+    return stream.records - extra
+
+
+MERGE_SQL = """
+WITH src AS (
+    SELECT DISTINCT ON (sku) sku, marca, sku_interno, nombre_producto, costo, stock
+    FROM stg_catalogo
+    WHERE sku IS NOT NULL
+    ORDER BY sku, _ord DESC
+), upd AS (
+    UPDATE catalogo_productos AS c
+    SET marca = s.marca,
+        nombre_producto = s.nombre_producto,
+        costo = s.costo,
+        stock = s.stock
+    FROM src AS s
+    WHERE c.sku = s.sku
+      AND (c.costo IS DISTINCT FROM s.costo
+           OR c.stock IS DISTINCT FROM s.stock
+           OR c.marca IS DISTINCT FROM s.marca
+           OR c.nombre_producto IS DISTINCT FROM s.nombre_producto)
+    RETURNING c.sku
+), ins AS (
+    INSERT INTO catalogo_productos (sku, marca, sku_interno, nombre_producto, costo, stock)
+    SELECT s.sku, s.marca, s.sku_interno, s.nombre_producto, s.costo, s.stock
+    FROM src AS s
+    WHERE NOT EXISTS (SELECT 1 FROM catalogo_productos c WHERE c.sku = s.sku)
+    RETURNING sku
+)
+SELECT (SELECT count(*) FROM ins), (SELECT count(*) FROM upd), (SELECT count(*) FROM src)
+"""
+
+
+def merge_insert(conn, rows, fmt: str = "text"):
+    """
+    Carga `rows` en una tabla temporal y aplica el diff contra catalogo_productos.
+    Devuelve (insertadas, actualizadas, sin_cambios).
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE stg_catalogo (
+                _ord bigserial,
+                sku text, marca text, sku_interno text, nombre_producto text,
+                costo numeric, stock integer
+            ) ON COMMIT DROP
+        """)
+    copy_insert(conn, rows, fmt, table="stg_catalogo")
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE stg_catalogo")
+        cur.execute(MERGE_SQL)
+        inserted, updated, staged = cur.fetchone()
+    return inserted, updated, staged - inserted - updated
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def row_digest(row) -> bytes:
+    return hashlib.blake2b(encode_row(row).encode("utf-8"), digest_size=12).digest()
+
+
+class ImportCache:
+    """
+    Estado local de la última importación exitosa hacia un destino (hash del DSN):
+    digest del archivo y digest por SKU. Solo se actualiza después del COMMIT en Postgres.
+    """
+
+    def __init__(self, path: str, db_url: str):
+        self.target = hashlib.blake2b(db_url.encode("utf-8"), digest_size=8).hexdigest()
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                target TEXT NOT NULL, name TEXT NOT NULL, digest TEXT NOT NULL,
+                PRIMARY KEY (target, name)
+            );
+            CREATE TABLE IF NOT EXISTS rows (
+                target TEXT NOT NULL, sku TEXT NOT NULL, digest BLOB NOT NULL,
+                PRIMARY KEY (target, sku)
+            ) WITHOUT ROWID;
+        """)
+        self.pushed = {}  # sku -> digest de las filas enviadas en esta corrida
+
+    def same_file(self, digest: str, name: str = "") -> bool:
+        """`name` distingue workbooks en modo multi-archivo; con uno solo se usa ''."""
+        r = self.db.execute("SELECT digest FROM files WHERE target = ? AND name = ?",
+                            (self.target, name)).fetchone()
+        return r is not None and r[0] == digest
+
+    def known(self) -> dict:
+        """sku -> digest de la última importación hacia este destino."""
+        return dict(self.db.execute("SELECT sku, digest FROM rows WHERE target = ?", (self.target,)))
+
+    def changed_rows(self, rows, pushed: dict = None, known: dict = None):
+        """
+        Filtra `rows` dejando solo las que cambiaron. Si un SKU se repite y alguna de sus
+        filas se envía, se envían también las siguientes para que la última siga ganando.
+        `known` (de known()) permite filtrar desde otro hilo sin tocar el SQLite.
+        """
+        pushed = self.pushed if pushed is None else pushed
+        known = self.known() if known is None else known
+        for row in rows:
+            sku = row[0]
+            d = row_digest(row)
+            if sku in pushed or known.get(sku) != d:
+                pushed[sku] = d
+                yield row
+
+    def commit(self, file_digest_: str, name: str = "", pushed: dict = None):
+        pushed = self.pushed if pushed is None else pushed
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO rows (target, sku, digest) VALUES (?, ?, ?)",
+                ((self.target, sku, d) for sku, d in pushed.items() if sku is not None),
+            )
+            self.db.execute("INSERT OR REPLACE INTO files (target, name, digest) VALUES (?, ?, ?)",
+                            (self.target, name, file_digest_))
+
+    def close(self):
+        self.db.close()
+
+
+def run_bench(conn, df: pd.DataFrame):
+    """
+    Mide armado de filas + carga para cada camino sobre una copia temporal de
+    catalogo_productos (mismos índices y defaults), así los SKUs ya existentes no chocan
+    con la tabla real. Todo se revierte al final.
+    """
+    dups = int(df["sku"].duplicated().sum())
+    if dups:
+        print(f"[AVISO] {dups} SKU(s) repetidos en el Excel: el benchmark usa la última fila de cada uno")
+        df = df.drop_duplicates("sku", keep="last")
+    table = "bench_catalogo"
+    cases = [
+        ("iterrows + execute_values", lambda: batch_insert(conn, iterrows_rows(df), table)),
+        ("columnas + COPY texto", lambda: copy_insert(conn, dataframe_rows(df), "text", table)),
+        ("columnas + COPY binario", lambda: copy_insert(conn, dataframe_rows(df), "binary", table)),
+    ]
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE TEMP TABLE {table} (LIKE catalogo_productos INCLUDING ALL) ON COMMIT DROP")
+        for name, fn in cases:
+            cur.execute("SAVEPOINT bench")
+            t0 = time.perf_counter()
+            fn()
+            dt = time.perf_counter() - t0
+            cur.execute("ROLLBACK TO SAVEPOINT bench")
+            print(f"{name:28s} {dt:8.2f}s  ({len(df) / dt:,.0f} filas/s)")
+    conn.rollback()
+
+
+def expand_inputs(spec: str) -> list:
+    """--file puede ser un archivo, una carpeta (sus .xlsx/.xlsm/.xls) o un patrón glob."""
+    if os.path.isdir(spec):
+        paths = [p for g in EXCEL_GLOBS for p in glob.glob(os.path.join(spec, g))]
+    elif glob.has_magic(spec):
+        paths = glob.glob(spec)
+    else:
+        return [spec]
+    return sorted(p for p in paths if not os.path.basename(p).startswith("~$"))
+
+
+def read_rows(path: str, stream: bool, chunk_rows: int):
+    """Filas normalizadas del workbook: streaming (openpyxl) o vía DataFrame."""
+    if stream:
+        return itertools.chain.from_iterable(read_excel_chunks(path, chunk_rows))
+    return dataframe_rows(normalize_dataframe(pd.read_excel(path)))
+
+
+def parse_workbook(path: str, stream: bool, chunk_rows: int) -> list:
+    """Worker del pool de procesos: lee y normaliza un workbook completo."""
+    return list(read_rows(path, stream, chunk_rows))
+
+
+def load_into(conn, rows, args) -> str:
+    """Aplica `rows` con el método elegido (sin COMMIT) y devuelve el resumen en texto."""
+    if args.merge:
+        inserted, updated, unchanged = merge_insert(conn, rows, args.copy_format)
+        return f"{inserted} insertadas, {updated} actualizadas, {unchanged} sin cambios"
+    if args.method == "values":
+        total = 0
+        for page in iter(lambda: list(itertools.islice(rows, args.chunk_rows)), []):
+            batch_insert(conn, page)
+            total += len(page)
+    else:
+        total = copy_insert(conn, rows, args.copy_format)
+    return f"{total} filas insertadas"
+
+
+def _load_file(pool, rows, args) -> str:
+    conn = pool.getconn()
+    try:
+        conn.autocommit = False
+        summary = load_into(conn, iter(rows), args)
+        conn.commit()
+        return summary
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+def _stream_rows(path: str, chunk_rows: int):
+    """Filas en streaming que abren el workbook recién al consumirse (en el hilo que carga)."""
+    yield from read_rows(path, True, chunk_rows)
+
+
+def import_many(paths: list, db_url: str, args, cache) -> bool:
+    """
+    Carga varios workbooks por un pool acotado de conexiones, una transacción por archivo.
+    Sin --stream los workbooks se leen en paralelo en procesos (como máximo uno por archivo) y
+    cada uno vuelve completo al proceso principal. Con --stream no hay pool de procesos: cada
+    hilo de carga lee su archivo por bloques, así que la memoria queda acotada a --db-workers
+    archivos x --chunk-rows filas. Devuelve True si todos terminaron bien.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+    t0 = time.perf_counter()
+    results = {}
+    digests, pushed = {}, {}
+    known = None
+    if cache:
+        for p in paths:
+            digests[p] = file_digest(p)
+            if cache.same_file(digests[p], os.path.basename(p)):
+                results[p] = ("OK", "sin cambios desde la última importación")
+        paths = [p for p in paths if p not in results]
+        known = cache.known()
+
+    def submit_load(load_ex, p, rows):
+        if cache:
+            pushed[p] = {}
+            rows = cache.changed_rows(rows, pushed[p], known)
+            if not args.stream:
+                rows = list(rows)
+        return load_ex.submit(_load_file, pool, rows, args)
+
+    pool = ThreadedConnectionPool(1, max(1, args.db_workers), db_url)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.db_workers)) as load_ex:
+            loading = {}
+            if args.stream:
+                for p in paths:
+                    loading[submit_load(load_ex, p, _stream_rows(p, args.chunk_rows))] = p
+            elif paths:
+                workers = max(1, min(args.workers, len(paths)))
+                with ProcessPoolExecutor(max_workers=workers) as parse_ex:
+                    parsing = {parse_ex.submit(parse_workbook, p, False, args.chunk_rows): p for p in paths}
+                    for fut in as_completed(parsing):
+                        p = parsing[fut]
+                        try:
+                            rows = fut.result()
+                        except Exception as e:
+                            results[p] = ("ERROR", f"lectura: {e}")
+                            continue
+                        loading[submit_load(load_ex, p, rows)] = p
+            for fut in as_completed(loading):
+                p = loading[fut]
+                try:
+                    results[p] = ("OK", fut.result())
+                except Exception as e:
+                    step = "lectura/inserción" if args.stream else "inserción"
+                    results[p] = ("ERROR", f"{step}: {e}")
+                    continue
+                if cache:
+                    cache.commit(digests[p], os.path.basename(p), pushed[p])
+    finally:
+        pool.closeall()
+
+    print(f"[RESUMEN] {len(results)} archivo(s) en {time.perf_counter() - t0:.1f}s")
+    for p in sorted(results):
+        status, detail = results[p]
+        print(f"  [{status}] {os.path.basename(p)}: {detail}")
+    return all(status == "OK" for status, _ in results.values())
+
+
 def main():
     args = parse_args()
     load_dotenv()
@@ -77,35 +535,66 @@ def main():
         print("ERROR: No se encontró DATABASE_URL", file=sys.stderr)
         sys.exit(1)
 
+    if args.bench and args.stream:
+        print("ERROR: --bench compara los caminos sobre un DataFrame; no se combina con --stream",
+              file=sys.stderr)
+        sys.exit(1)
+
+    paths = expand_inputs(args.file)
+    if not paths:
+        print(f"ERROR: no se encontraron archivos Excel en '{args.file}'", file=sys.stderr)
+        sys.exit(1)
+
+    cache = None
+    if args.cache and not args.bench:
+        base = args.file if os.path.isdir(args.file) else os.path.dirname(os.path.abspath(paths[0]))
+        cache = ImportCache(args.state or os.path.join(base, STATE_FILE), db_url)
+        args.merge = True
+
+    if len(paths) > 1 and not args.bench:
+        ok = import_many(paths, db_url, args, cache)
+        if cache:
+            cache.close()
+        sys.exit(0 if ok else 1)
+
+    path = paths[0]
+    if cache:
+        fdigest = file_digest(path)
+        if cache.same_file(fdigest):
+            print("OK: el archivo no cambió desde la última importación; nada que hacer.")
+            cache.close()
+            return
+
     try:
-        df = pd.read_excel(args.file)
-        df = normalize_dataframe(df)
+        if args.bench:
+            df = normalize_dataframe(pd.read_excel(path))
+            rows = None
+        else:
+            rows = read_rows(path, args.stream, args.chunk_rows)
+        if cache:
+            rows = cache.changed_rows(rows)
     except Exception as e:
         print(f"ERROR leyendo/validando Excel: {e}", file=sys.stderr)
         sys.exit(1)
 
-    rows = [
-        (
-            r["sku"],
-            r["marca"],
-            r["sku_interno"],
-            r["nombre_producto"],
-            None if pd.isna(r["costo"]) else float(r["costo"]),
-            int(r["stock"]),
-        )
-        for _, r in df.iterrows()
-    ]
-
     try:
         with psycopg2.connect(db_url) as conn:
             conn.autocommit = False
-            batch_insert(conn, rows)
+            if args.bench:
+                run_bench(conn, df)
+                return
+            summary = load_into(conn, rows, args)
             conn.commit()
     except Exception as e:
         print(f"ERROR en inserción: {e}", file=sys.stderr)
         sys.exit(1)
 
-    print(f"OK: Insertadas {len(rows)} filas en catalogo_productos.")
+    if cache:
+        cache.commit(fdigest)
+        cache.close()
+        print(f"[INFO] Caché: {len(cache.pushed)} SKU(s) con cambios enviados; el resto se omitió.")
+
+    print(f"OK: catalogo_productos -> {summary}.")
 
 
 if __name__ == "__main__":
@@ -7,25 +7,93 @@ Uso:
   python copy_catalogo_to_inserts.py backup.sql > catalogo_inserts.sql
   # Luego abre catalogo_inserts.sql en VS Code y ejecuta (Ctrl+Enter) o:
   # psql "<CONN_STRING>" -f catalogo_inserts.sql
+
+  # Otra tabla del mismo respaldo (usa el índice <backup.sql>.copyidx.json):
+  python copy_catalogo_to_inserts.py backup.sql --table marcas > marcas_inserts.sql
+
+Índice de bloques:
+  La primera corrida escanea el dump con mmap y guarda en <backup.sql>.copyidx.json
+  el offset, columnas y número de filas de cada bloque COPY. Las siguientes corridas
+  (de cualquier tabla) saltan directo al bloque mientras el archivo no cambie
+  (tamaño, mtime y huella de contenido). --no-index desactiva este comportamiento.
+
+Varias tablas en una sola pasada:
+  python copy_catalogo_to_inserts.py backup.sql --tables marcas,combos,catalogo_productos,combo_items --out-dir out/
+  # Un archivo por tabla (NN_<tabla>_inserts.sql) + out/load_all.sql en orden seguro para FKs:
+  # psql "<CONN_STRING>" -f out/load_all.sql
+
+Lotes y upsert:
+  Cada INSERT se cierra al llegar a --batch-bytes (1 MiB) o --batch-rows (5000), lo primero.
+  --upsert emite ON CONFLICT (sku) DO UPDATE para reaplicar sobre un catalogo_productos vivo:
+  python copy_catalogo_to_inserts.py backup.sql --upsert > catalogo_upsert.sql
+  # Una llave repetida dentro de un mismo INSERT haría fallar el ON CONFLICT DO UPDATE
+  # ("cannot affect row a second time"), así que --upsert implica --dedupe <KEY> --keep last
+  # salvo que se pase --dedupe explícito o --no-dedupe.
+
+Subconjuntos (se filtra en streaming; las filas descartadas no se des-escapan):
+  python copy_catalogo_to_inserts.py backup.sql --columns sku,marca,costo \\
+      --where "marca=DGL LATAM" --where "sku^=DG" --where "sku@skus.txt"
+
+Duplicados (evita que los INSERTs fallen contra el índice único a media transacción):
+  python copy_catalogo_to_inserts.py backup.sql --dedupe sku --keep last --dedupe-mem 512
+  # Exacto en memoria hasta --dedupe-mem; después corridas ordenadas en disco + merge.
+
+Respaldos comprimidos (gzip/zstd, detectado por bytes mágicos; zstd requiere 'zstandard'):
+  python copy_catalogo_to_inserts.py backup.sql.zst -o catalogo_inserts.sql.gz
+  # El índice y --workers solo aplican a dumps sin comprimir (necesitan seek).
+
+Parseo en paralelo (usa los offsets del índice para repartir el bloque):
+  python copy_catalogo_to_inserts.py backup.sql --workers 16 > catalogo_inserts.sql
+
+Carga directa (sin archivo intermedio, requiere psycopg2):
+  python copy_catalogo_to_inserts.py backup.sql --load "<CONN_STRING>" [--truncate | --swap]
 """
 
+import argparse
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import mmap
+import os
 import sys
 import re
+import tempfile
+
+from pgcopy import NULL, CopyStream, decode_field, decode_line
 
 # === Ajustes rápidos ===
 TABLE_TARGET = "catalogo_productos"   # solo esta tabla
-BATCH_SIZE = 500                      # filas por INSERT (sube a 1000/2000 si quieres)
+BATCH_BYTES = 1 << 20                 # presupuesto de bytes por INSERT (criterio principal)
+BATCH_SIZE = 5000                     # tope secundario de filas por INSERT
 WRAP_IN_TX = True                     # genera BEGIN/COMMIT para acelerar
+PARALLEL_CHUNK = 8 << 20              # bytes por rango en modo --workers
+READ_BUFFER = 4 << 20                 # buffer de lectura (mantiene la descompresión ocupada)
+OUT_BUFFER = 1 << 20                  # buffer de cada archivo de salida en modo multi-tabla
+DEDUPE_MEM = 256 << 20                # memoria (aprox.) del dedupe antes de volcar a disco
+DEDUPE_MIN_MEM = 1                    # MB mínimos para --dedupe-mem (menos = una corrida por fila)
+DEDUPE_FANIN = 64                     # corridas en disco abiertas a la vez por cada merge
+
+# Orden de carga que respeta las FKs (marcas -> combos -> catalogo_productos -> combo_items).
+# Las tablas que no estén aquí van al final, en el orden en que se pidieron.
+FK_ORDER = ["marcas", "combos", "catalogo_productos", "articulos", "combo_items"]
 
 COPY_RE = re.compile(
     r'^\s*COPY\s+([^\s(]+)\s*\(([^)]+)\)\s+FROM\s+stdin;\s*$',
     re.IGNORECASE
 )
 
-def copy_unescape(v: str) -> str:
-    # Des-escapes típicos del formato COPY texto
-    v = v.replace(r'\t', '\t').replace(r'\n', '\n').replace(r'\r', '\r').replace(r'\\', '\\')
-    return v
+# Versión en bytes para el escaneo con mmap (mismo criterio que COPY_RE)
+COPY_RE_B = re.compile(
+    rb'^[ \t]*COPY[ \t]+([^\s(]+)[ \t]*\(([^)\n]+)\)[ \t]+FROM[ \t]+stdin;[ \t]*\r?$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+INDEX_SUFFIX = ".copyidx.json"
+INDEX_VERSION = 2
+HASH_SAMPLE = 1 << 20      # bytes del inicio y del final que entran en la huella
+COUNT_CHUNK = 64 << 20     # tamaño de trozo al contar filas dentro del mmap
 
 def sql_quote(v: str | None) -> str:
     if v is None:
@@ -35,66 +103,758 @@ def sql_quote(v: str | None) -> str:
 def values_tuple(parts):
     return "(" + ", ".join(sql_quote(p) for p in parts) + ")"
 
-def main(path: str):
-    with open(path, "r", encoding="utf-8", errors="replace") as f:
-        lines = f.readlines()
-
-    in_block = False
-    table = None
-    columns = []
-    rows = []
-
-    for line in lines:
-        if not in_block:
-            m = COPY_RE.match(line)
-            if m:
-                table = m.group(1).strip()              # p.ej. public.catalogo_productos
-                tshort = table.lower().split(".")[-1]    # nombre sin esquema
-                if tshort != TABLE_TARGET:
-                    # Saltar otros COPYs
-                    table = None
-                    continue
-                columns = [c.strip() for c in m.group(2).split(",")]
-                in_block = True
-                continue
-        else:
-            s = line.rstrip("\n")
-            if s == r'\.':
-                break  # fin del bloque COPY
-            # parsear línea de datos (tab-delimited)
+def find_copy_block(f, target: str):
+    """
+    Avanza sobre el archivo (línea a línea, sin cargarlo) hasta el COPY de `target`.
+    Devuelve la lista de columnas, o None si el bloque no existe.
+    """
+    for line in f:
+        m = COPY_RE.match(line)
+        if not m:
+            continue
+        tshort = m.group(1).strip().lower().split(".")[-1]   # nombre sin esquema
+        if tshort != target:
+            continue  # saltar otros COPYs
+        return [c.strip() for c in m.group(2).split(",")]
+    return None
+
+def file_fingerprint(path: str) -> dict:
+    """
+    Huella barata del dump: tamaño, mtime y blake2b del primer y último MiB.
+    No relee el archivo completo (eso anularía la ventaja del índice).
+    """
+    st = os.stat(path)
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        h.update(f.read(HASH_SAMPLE))
+        if st.st_size > HASH_SAMPLE:
+            f.seek(max(HASH_SAMPLE, st.st_size - HASH_SAMPLE))
+            h.update(f.read(HASH_SAMPLE))
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": h.hexdigest()}
+
+def _count_lines(mm, start: int, end: int) -> int:
+    n = 0
+    for pos in range(start, end, COUNT_CHUNK):
+        n += mm[pos:min(pos + COUNT_CHUNK, end)].count(b"\n")
+    return n
+
+def scan_copy_blocks(path: str) -> list:
+    """
+    Escaneo único con mmap de todos los bloques 'COPY ... FROM stdin;'.
+    Los datos de cada bloque se saltan buscando el terminador, sin aplicar el regex.
+    """
+    blocks = []
+    if os.path.getsize(path) == 0:
+        return blocks
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = 0
+        size = len(mm)
+        while True:
+            m = COPY_RE_B.search(mm, pos)
+            if not m:
+                break
+            start = m.end() + 1                # primera línea de datos
+            if start > size:
+                break
+            if mm[start:start + 3] in (b"\\.\n", b"\\.\r") or mm[start:] == b"\\.":
+                end = start                    # bloque vacío
+            else:
+                end = mm.find(b"\n\\.", start - 1)
+                while end != -1 and mm[end + 3:end + 4] not in (b"\n", b"\r", b""):
+                    end = mm.find(b"\n\\.", end + 1)
+                end = size if end == -1 else end + 1
+            blocks.append({
+                "table": m.group(1).decode("utf-8", "replace").strip(),
+                "columns": [c.strip() for c in m.group(2).decode("utf-8", "replace").split(",")],
+                "offset": start,
+                "end": end,                    # inicio de la línea '\\.'
+                "rows": _count_lines(mm, start, end),
+            })
+            pos = end
+    return blocks
+
+def load_or_build_index(path: str) -> list:
+    """Devuelve los bloques del índice sidecar; lo (re)construye si falta o está desfasado."""
+    idx_path = path + INDEX_SUFFIX
+    fp = file_fingerprint(path)
+    try:
+        with open(idx_path, "r", encoding="utf-8") as f:
+            idx = json.load(f)
+        if idx.get("version") == INDEX_VERSION and all(idx.get(k) == v for k, v in fp.items()):
+            return idx["blocks"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    blocks = scan_copy_blocks(path)
+    try:
+        with open(idx_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, **fp, "blocks": blocks}, f, ensure_ascii=False, indent=1)
+        sys.stderr.write(f"[INFO] Índice de bloques COPY guardado en {idx_path} ({len(blocks)} bloques).\n")
+    except OSError as e:
+        sys.stderr.write(f"[WARN] No se pudo guardar el índice {idx_path}: {e}\n")
+    return blocks
+
+def find_indexed_block(blocks: list, target: str):
+    for b in blocks:
+        if b["table"].lower().split(".")[-1] == target:
+            return b
+    return None
+
+def iter_copy_lines(f, ncols: int, warn=None):
+    """
+    Generador de líneas crudas (formato COPY texto) del bloque ya posicionado; valida el
+    número de columnas y se detiene en el terminador '\\.' sin leer el resto del dump.
+    """
+    for line in f:
+        s = line.rstrip("\n")
+        if s == r'\.':
+            return  # fin del bloque COPY
+        found = s.count("\t") + 1
+        if found != ncols:
+            (warn or sys.stderr.write)(
+                f"[WARN] columnas esperadas={ncols}, encontradas={found}. Línea omitida.\n"
+            )
+            continue
+        yield s
+
+def iter_copy_rows(f, ncols: int, warn=None):
+    """Igual que iter_copy_lines, pero produce cada fila ya des-escapada (None para '\\N')."""
+    for s in iter_copy_lines(f, ncols, warn):
+        # '\N' => NULL, el resto se des-escapa (vacío incluido) con el codec de pgcopy
+        yield decode_line(s)
+
+# Operadores de --where, en orden de prueba ('^=' antes que '=')
+WHERE_OPS = ("^=", "=", "~", "@")
+
+def parse_where(spec: str):
+    """
+    'col=valor' (igual), 'col^=prefijo', 'col~regex' o 'col@archivo' (IN-list, un valor por línea).
+    Devuelve (columna, operador, valor preparado).
+    """
+    for op in WHERE_OPS:
+        col, sep, val = spec.partition(op)
+        if sep and col and not any(o in col for o in WHERE_OPS):
+            col = col.strip()
+            if op == "~":
+                return col, op, re.compile(val)
+            if op == "@":
+                with open(val, "r", encoding="utf-8") as f:
+                    return col, op, frozenset(x.strip() for x in f if x.strip())
+            return col, op, val
+    raise SystemExit(f"ERROR: filtro inválido '{spec}' (usa col=v, col^=pref, col~regex o col@archivo)")
+
+def _matches(op: str, want, v) -> bool:
+    if v is None:
+        return False
+    if op == "=":
+        return v == want
+    if op == "^=":
+        return v.startswith(want)
+    if op == "~":
+        return want.search(v) is not None
+    return v in want
+
+class Selection:
+    """
+    Proyección de columnas + filtros (AND) aplicados sobre las líneas crudas del bloque.
+    Solo se des-escapan los campos que usan los filtros; las filas descartadas nunca se
+    des-escapan completas ni se citan. Es picklable para los workers de --workers.
+    """
+
+    def __init__(self, columns, select=None, where=()):
+        pos = {c: i for i, c in enumerate(columns)}
+        missing = [c for c in list(select or []) + [w[0] for w in where] if c not in pos]
+        if missing:
+            raise SystemExit(f"ERROR: columnas inexistentes en el bloque COPY: {missing}")
+        self.out_columns = list(select) if select else list(columns)
+        self.idxs = [pos[c] for c in self.out_columns]
+        self.preds = [(pos[c], op, want) for c, op, want in where]
+        self.identity = not self.preds and self.out_columns == list(columns)
+
+    def _keep(self, parts) -> bool:
+        return all(_matches(op, want, decode_field(parts[i])) for i, op, want in self.preds)
+
+    def rows(self, lines):
+        """Filas seleccionadas ya des-escapadas (para INSERTs)."""
+        if self.identity:
+            for s in lines:
+                yield decode_line(s)
+            return
+        for s in lines:
             parts = s.split("\t")
-            # '\N' => NULL, el resto va literal (incluye vacío)
-            parsed = [None if p == r'\N' else copy_unescape(p) for p in parts]
-            if len(parsed) != len(columns):
-                sys.stderr.write(
-                    f"[WARN] columnas esperadas={len(columns)}, encontradas={len(parsed)}. Línea omitida.\n"
-                )
-                continue
-            rows.append(parsed)
+            if self._keep(parts):
+                yield [decode_field(parts[i]) for i in self.idxs]
 
-    if not rows:
-        sys.stderr.write("No se encontró bloque COPY para catalogo_productos o no tenía filas.\n")
+    def raw_lines(self, lines):
+        """Líneas seleccionadas en formato COPY texto, sin des-escapar (para --load)."""
+        if self.identity:
+            yield from lines
+            return
+        for s in lines:
+            parts = s.split("\t")
+            if self._keep(parts):
+                yield "\t".join(parts[i] for i in self.idxs)
+
+def _write_run(items):
+    """Ordena (llave, seq, línea) por llave/seq y los vuelca a un archivo temporal."""
+    items.sort()
+    run = tempfile.TemporaryFile("w+", encoding="utf-8", newline="\n")
+    run.writelines(f"{k}\t{seq:012d}\t{s}\n" for k, seq, s in items)
+    run.seek(0)
+    return run
+
+def _read_run(run):
+    for line in run:
+        k, seq, s = line.rstrip("\n").split("\t", 2)
+        yield k, int(seq), s
+
+def _collapse(items, keep: str, stats: dict):
+    """Deja un (llave, seq, línea) por llave de una secuencia ordenada por llave/seq."""
+    for _k, group in itertools.groupby(items, key=lambda item: item[0]):
+        group = list(group)
+        stats["dropped"] += len(group) - 1
+        yield group[0] if keep == "first" else group[-1]
+
+def _merge_runs(runs, keep: str, stats: dict):
+    """Mezcla las corridas en una sola (ya sin duplicados) y cierra las originales."""
+    merged = tempfile.TemporaryFile("w+", encoding="utf-8", newline="\n")
+    try:
+        for k, seq, s in _collapse(heapq.merge(*(_read_run(r) for r in runs)), keep, stats):
+            merged.write(f"{k}\t{seq:012d}\t{s}\n")
+    finally:
+        for r in runs:
+            r.close()
+    merged.seek(0)
+    return merged
+
+def dedupe_lines(lines, key_idx: int, keep: str = "first", mem_limit: int = DEDUPE_MEM, stats: dict = None):
+    """
+    Quita filas con la llave repetida (campo crudo `key_idx`) conservando la primera o la última.
+
+    Mientras la memoria estimada cabe en `mem_limit` se usa un set/dict exacto y el orden
+    original se conserva (keep=first emite en streaming). Al rebasarlo, el resto se vuelca a
+    corridas ordenadas en disco y se mezclan al final con heapq.merge; esas filas salen en
+    orden de llave. Nunca hay más de DEDUPE_FANIN corridas abiertas por nivel: al llenarse un
+    nivel se mezcla en una corrida del siguiente. Las llaves NULL no se consideran duplicadas
+    (igual que un índice único).
+    """
+    stats = stats if stats is not None else {}
+    stats["dropped"] = 0
+    seen = set()      # keep=first: llaves ya emitidas
+    last = {}         # keep=last: llave -> (seq, línea), reinsertada para reflejar la última posición
+    used = 0
+    spilling = False
+    levels, buf, buf_used = [[]], [], 0   # levels[i]: corridas que ya pasaron por i merges
+
+    def add_run(run, level: int = 0):
+        while True:
+            if level == len(levels):
+                levels.append([])
+            levels[level].append(run)
+            if len(levels[level]) < DEDUPE_FANIN:
+                return
+            run = _merge_runs(levels[level], keep, stats)
+            levels[level] = []
+            level += 1
+
+    for seq, s in enumerate(lines):
+        k = s.split("\t", key_idx + 1)[key_idx]
+        if k == NULL:
+            yield s
+            continue
+        if keep == "first" and k in seen:
+            stats["dropped"] += 1
+            continue
+        if not spilling:
+            if keep == "first":
+                seen.add(k)
+                used += len(k) + 64
+                yield s
+            else:
+                if last.pop(k, None) is not None:
+                    stats["dropped"] += 1
+                last[k] = (seq, s)
+                used += len(k) + len(s) + 128
+            if used > mem_limit:
+                spilling = True
+                if last:
+                    add_run(_write_run([(k2, q, l2) for k2, (q, l2) in last.items()]))
+                    last.clear()
+                sys.stderr.write("[INFO] dedupe: límite de memoria alcanzado, usando corridas en disco.\n")
+            continue
+        buf.append((k, seq, s))
+        buf_used += len(k) + len(s) + 128
+        if buf_used > mem_limit:
+            add_run(_write_run(buf))
+            buf, buf_used = [], 0
+
+    if not spilling:
+        for _seq, s in last.values():
+            yield s
         return
 
-    cols_sql = ", ".join(columns)
-    if WRAP_IN_TX:
-        print("BEGIN;")
+    runs = [r for level in levels for r in level]
+    try:
+        while len(runs) >= DEDUPE_FANIN:
+            runs = [_merge_runs(runs[i:i + DEDUPE_FANIN], keep, stats)
+                    for i in range(0, len(runs), DEDUPE_FANIN)]
+        buf.sort()
+        merged = heapq.merge(*(_read_run(r) for r in runs), iter(buf))
+        for item in _collapse(merged, keep, stats):
+            yield item[2]
+    finally:
+        for r in runs:
+            r.close()
 
-    # Generar INSERTs por lotes
+def upsert_clause(columns, key: str) -> str:
+    """ON CONFLICT (key) DO UPDATE para las columnas que no son llave."""
+    if key not in columns:
+        raise SystemExit(f"ERROR: la columna llave '{key}' no está en el bloque COPY: {columns}")
+    sets = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns if c != key)
+    if not sets:
+        return f" ON CONFLICT ({key}) DO NOTHING"
+    return f" ON CONFLICT ({key}) DO UPDATE SET {sets}"
+
+def write_values(out, table: str, columns, tuples, on_conflict: str = "",
+                 batch_bytes: int = BATCH_BYTES, batch_rows: int = BATCH_SIZE) -> int:
+    """
+    Escribe INSERTs multi-row en cuanto se llena cada lote (memoria constante).
+    `tuples` son tuplas ya renderizadas por values_tuple(). El lote se cierra al llegar a
+    `batch_bytes` (filas anchas => menos filas) o a `batch_rows`, lo que ocurra primero.
+    BEGIN se emite con el primer lote para no dejar una transacción vacía.
+    Devuelve el número de filas escritas.
+    """
+    head = f"INSERT INTO public.{table} ({', '.join(columns)}) VALUES "
+    tail = on_conflict + ";\n"
+    total = 0
     batch = []
-    for r in rows:
-        batch.append(values_tuple(r))
-        if len(batch) >= BATCH_SIZE:
-            print(f"INSERT INTO public.{TABLE_TARGET} ({cols_sql}) VALUES " + ", ".join(batch) + ";")
+    size = 0
+
+    def flush():
+        if WRAP_IN_TX and total == 0:
+            out.write("BEGIN;\n")
+        out.write(head + ", ".join(batch) + tail)
+
+    for t in tuples:
+        batch.append(t)
+        size += len(t) + 2
+        if size >= batch_bytes or len(batch) >= batch_rows:
+            flush()
+            total += len(batch)
             batch = []
+            size = 0
     if batch:
-        print(f"INSERT INTO public.{TABLE_TARGET} ({cols_sql}) VALUES " + ", ".join(batch) + ";")
+        flush()
+        total += len(batch)
 
-    if WRAP_IN_TX:
-        print("COMMIT;")
+    if WRAP_IN_TX and total:
+        out.write("COMMIT;\n")
+    return total
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        sys.stderr.write("Uso: python copy_catalogo_to_inserts.py <backup.sql>\n")
+def write_inserts(out, table: str, columns, rows, **kw) -> int:
+    return write_values(out, table, columns, (values_tuple(r) for r in rows), **kw)
+
+def split_ranges(path: str, start: int, end: int, chunk: int) -> list:
+    """Parte [start, end) en rangos de ~chunk bytes alineados a fin de línea."""
+    bounds = [start]
+    with open(path, "rb") as f:
+        pos = start
+        while pos + chunk < end:
+            f.seek(pos + chunk)
+            f.readline()
+            pos = f.tell()
+            if pos >= end:
+                break
+            bounds.append(pos)
+    bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _parse_range(task):
+    """
+    Worker del pool: lee un rango de líneas del bloque y devuelve las tuplas SQL ya
+    renderizadas más los [WARN] en orden, para que el proceso principal los emita igual
+    que en modo secuencial.
+    """
+    path, start, end, ncols, sel = task
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8", errors="replace")
+    warns = []
+    lines = io.StringIO(text, newline=None)   # mismos saltos de línea que open() en modo texto
+    return [values_tuple(r) for r in sel.rows(iter_copy_lines(lines, ncols, warns.append))], warns
+
+def iter_parallel_tuples(path: str, block: dict, workers: int, sel: "Selection"):
+    """
+    Parsea el bloque indexado en un ProcessPoolExecutor y entrega las tuplas en el orden
+    original. Mantiene como máximo 2 rangos por worker en vuelo para acotar la memoria.
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    ncols = len(block["columns"])
+    tasks = [(path, a, b, ncols, sel) for a, b in split_ranges(path, block["offset"], block["end"], PARALLEL_CHUNK)]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        pending = deque()
+        for task in tasks:
+            pending.append(ex.submit(_parse_range, task))
+            if len(pending) >= workers * 2:
+                tuples, warns = pending.popleft().result()
+                for w in warns:
+                    sys.stderr.write(w)
+                yield from tuples
+        while pending:
+            tuples, warns = pending.popleft().result()
+            for w in warns:
+                sys.stderr.write(w)
+            yield from tuples
+
+# Firmas de los formatos comprimidos que aceptamos como entrada
+MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+
+def detect_compression(path: str):
+    with open(path, "rb") as f:
+        head = f.read(4)
+    for magic, fmt in MAGIC.items():
+        if head.startswith(magic):
+            return fmt
+    return None
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        sys.stderr.write("ERROR: para .zst instala el paquete 'zstandard' (pip install zstandard)\n")
         sys.exit(1)
-    main(sys.argv[1])
+    return zstandard
+
+def open_dump(path: str):
+    """
+    Abre el dump en binario con buffer grande, descomprimiendo al vuelo si es gzip/zstd
+    (detectado por los bytes mágicos, no por la extensión).
+    """
+    fmt = detect_compression(path)
+    if fmt == "gzip":
+        import gzip
+        return io.BufferedReader(gzip.GzipFile(path, "rb"), READ_BUFFER)
+    raw = open(path, "rb", buffering=READ_BUFFER)
+    if fmt == "zstd":
+        reader = _zstd().ZstdDecompressor().stream_reader(raw, read_size=READ_BUFFER, closefd=True)
+        return io.BufferedReader(reader, READ_BUFFER)
+    return raw
+
+def open_output(path: str = None):
+    """
+    Salida de texto: stdout si no hay ruta; .gz / .zst se comprimen en streaming.
+    """
+    if not path:
+        return sys.stdout
+    if path.endswith(".gz"):
+        import gzip
+        raw = io.BufferedWriter(gzip.GzipFile(path, "wb", compresslevel=6), OUT_BUFFER)
+    elif path.endswith(".zst"):
+        raw = _zstd().ZstdCompressor(level=3).stream_writer(open(path, "wb", buffering=OUT_BUFFER), closefd=True)
+    else:
+        raw = open(path, "wb", buffering=OUT_BUFFER)
+    return io.TextIOWrapper(raw, encoding="utf-8", write_through=False)
+
+def open_copy_block(path: str, target: str, use_index: bool = True):
+    """
+    Abre el dump posicionado en la primera fila de datos del bloque de `target`.
+    Devuelve (archivo_texto, columnas) o (None, None) si el bloque no existe.
+    Los dumps comprimidos no admiten seek: se recorren secuencialmente sin índice.
+    """
+    use_index = use_index and detect_compression(path) is None
+    raw = open_dump(path)
+    columns = None
+    if use_index:
+        block = find_indexed_block(load_or_build_index(path), target)
+        if block is None:
+            raw.close()
+            return None, None
+        raw.seek(block["offset"])
+        columns = block["columns"]
+    f = io.TextIOWrapper(raw, encoding="utf-8", errors="replace")
+    if columns is None:
+        columns = find_copy_block(f, target)
+        if columns is None:
+            f.close()
+            return None, None
+    return f, columns
+
+def quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def staging_index_renames(cur, target: str, staging: str):
+    """
+    Pares (índice de staging, índice original) emparejados por definición (columnas, opclass,
+    unicidad, expresión y predicado): LIKE ... INCLUDING ALL los recrea con nombres generados.
+    """
+    sql = (
+        "SELECT c.relname, i.indkey::text, i.indclass::text, i.indisunique, i.indisprimary, "
+        "coalesce(pg_get_expr(i.indexprs, i.indrelid), ''), coalesce(pg_get_expr(i.indpred, i.indrelid), '') "
+        "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = %s::regclass ORDER BY c.oid"
+    )
+    cur.execute(sql, (target,))
+    old = {}
+    for name, *key in cur.fetchall():
+        old.setdefault(tuple(key), []).append(name)
+    cur.execute(sql, (staging,))
+    pairs = []
+    for name, *key in cur.fetchall():
+        names = old.get(tuple(key))
+        if names:
+            pairs.append((name, names.pop(0)))
+    return pairs
+
+def load_copy_block(dsn: str, table: str, columns, lines, mode: str = "append") -> int:
+    """
+    Carga el bloque directo en Postgres con COPY FROM STDIN (psycopg2 copy_expert).
+      mode="append":   COPY sobre la tabla tal cual
+      mode="truncate": TRUNCATE + COPY en la misma transacción
+      mode="swap":     COPY en <tabla>__staging y luego intercambio por RENAME (atómico);
+                       pasa las secuencias SERIAL a la tabla nueva y restaura los nombres de índices.
+                       Rechaza tablas referenciadas por FKs o con columnas IDENTITY.
+    """
+    import time
+    import psycopg2
+
+    cols_sql = ", ".join(columns)
+    target = f"public.{table}"
+    staging = f"{table}__staging"
+    # Las líneas del dump ya están en formato COPY texto: se envían tal cual
+    stream = CopyStream((s + "\n").encode("utf-8") for s in lines)
+    t0 = time.perf_counter()
+
+    with psycopg2.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            dest = target
+            if mode == "swap":
+                # El RENAME no mueve las FKs que apuntan a la tabla: en ese caso usar --truncate
+                cur.execute(
+                    "SELECT conrelid::regclass::text FROM pg_constraint "
+                    "WHERE contype = 'f' AND confrelid = %s::regclass",
+                    (target,),
+                )
+                deps = [r[0] for r in cur.fetchall()]
+                if deps:
+                    raise RuntimeError(f"{target} es referenciada por FKs de {deps}; usa --truncate en lugar de --swap")
+                # LIKE crea columnas IDENTITY con una secuencia nueva (reiniciada): no se intercambian
+                cur.execute(
+                    "SELECT attname FROM pg_attribute "
+                    "WHERE attrelid = %s::regclass AND attidentity <> '' AND NOT attisdropped",
+                    (target,),
+                )
+                identity = [r[0] for r in cur.fetchall()]
+                if identity:
+                    raise RuntimeError(f"{target} tiene columnas IDENTITY {identity}; usa --truncate en lugar de --swap")
+                cur.execute(f"DROP TABLE IF EXISTS public.{staging}")
+                cur.execute(f"CREATE TABLE public.{staging} (LIKE {target} INCLUDING ALL)")
+                dest = f"public.{staging}"
+            elif mode == "truncate":
+                cur.execute(f"TRUNCATE {target}")
+
+            cur.copy_expert(f"COPY {dest} ({cols_sql}) FROM STDIN", stream, size=OUT_BUFFER)
+
+            if mode == "swap":
+                renames = staging_index_renames(cur, target, f"public.{staging}")
+                cur.execute(f"ALTER TABLE {target} RENAME TO {table}__old")
+                cur.execute(f"ALTER TABLE public.{staging} RENAME TO {table}")
+                # Las secuencias SERIAL (nextval copiado por LIKE) siguen siendo de la tabla vieja:
+                # pasarlas a la nueva para que el DROP no falle ni se las lleve
+                cur.execute(
+                    "SELECT d.objid::regclass::text, a.attname FROM pg_depend d "
+                    "JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S' "
+                    "JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid "
+                    "WHERE d.classid = 'pg_class'::regclass AND d.refclassid = 'pg_class'::regclass "
+                    "AND d.deptype = 'a' AND d.refobjid = %s::regclass",
+                    (f"public.{table}__old",),
+                )
+                for seq, col in cur.fetchall():
+                    cur.execute(f"ALTER SEQUENCE {seq} OWNED BY {target}.{quote_ident(col)}")
+                cur.execute(f"DROP TABLE public.{table}__old")
+                # Índices (y las constraints PK/UNIQUE que respaldan) con los nombres originales
+                for new_name, old_name in renames:
+                    cur.execute(f"ALTER INDEX public.{quote_ident(new_name)} RENAME TO {quote_ident(old_name)}")
+        conn.commit()
+    conn.close()
+
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+    sys.stderr.write(
+        f"[OK] {table}: {stream.records} filas cargadas ({mode}) en {elapsed:.2f}s "
+        f"-> {stream.records / elapsed:,.0f} filas/s, {stream.bytes / 1e6:.1f} MB enviados.\n"
+    )
+    return stream.records
+
+def fk_sorted(tables):
+    rank = {t: i for i, t in enumerate(FK_ORDER)}
+    return sorted(tables, key=lambda t: (rank.get(t, len(FK_ORDER)), tables.index(t)))
+
+def main_multi(path: str, tables, out_dir: str):
+    """
+    Convierte varias tablas recorriendo el dump una sola vez.
+    Cada tabla se escribe con su propio writer con buffer; load_all.sql las incluye en orden FK.
+    """
+    tables = fk_sorted(list(dict.fromkeys(t.lower().split(".")[-1] for t in tables)))
+    os.makedirs(out_dir, exist_ok=True)
+    names = {t: f"{i + 1:02d}_{t}_inserts.sql" for i, t in enumerate(tables)}
+    writers = {t: open(os.path.join(out_dir, names[t]), "w", encoding="utf-8", buffering=OUT_BUFFER)
+               for t in tables}
+    totals = {t: 0 for t in tables}
+    pending = set(tables)
+    try:
+        with io.TextIOWrapper(open_dump(path), encoding="utf-8", errors="replace") as f:
+            for line in f:
+                m = COPY_RE.match(line)
+                if not m:
+                    continue
+                tshort = m.group(1).strip().lower().split(".")[-1]
+                if tshort not in pending:
+                    continue
+                columns = [c.strip() for c in m.group(2).split(",")]
+                # iter_copy_rows consume hasta '\.', el bucle sigue con el siguiente COPY
+                totals[tshort] = write_inserts(writers[tshort], tshort, columns, iter_copy_rows(f, len(columns)))
+                pending.discard(tshort)
+                if not pending:
+                    break  # ya están todas; no leer el resto del dump
+    finally:
+        for w in writers.values():
+            w.close()
+
+    with open(os.path.join(out_dir, "load_all.sql"), "w", encoding="utf-8") as f:
+        for t in tables:
+            f.write(f"\\ir {names[t]}\n")
+
+    for t in tables:
+        if totals[t]:
+            sys.stderr.write(f"[OK] {t}: {totals[t]} filas -> {names[t]}\n")
+        else:
+            sys.stderr.write(f"[WARN] No se encontró bloque COPY para {t} o no tenía filas.\n")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convierte un bloque COPY de pg_dump en INSERTs multi-row")
+    parser.add_argument("dump", help="Ruta al respaldo .sql (formato plano; también .sql.gz / .sql.zst)")
+    parser.add_argument("-o", "--output",
+                        help="Archivo de salida (default: stdout); .gz o .zst se comprimen al vuelo")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--table", default=TABLE_TARGET, help=f"Tabla a extraer (default: {TABLE_TARGET})")
+    group.add_argument("--tables", help="Lista separada por comas; convierte todas en una sola pasada")
+    parser.add_argument("--out-dir", default=".", help="Carpeta de salida para --tables (default: .)")
+    parser.add_argument("--columns", help="Proyección: columnas a conservar, separadas por comas")
+    parser.add_argument("--where", action="append", default=[], metavar="FILTRO",
+                        help="col=v | col^=prefijo | col~regex | col@archivo (IN-list). Repetible (AND)")
+    parser.add_argument("--dedupe", nargs="?", const="sku", metavar="COL",
+                        help="Descarta filas con la llave COL repetida (COL default: sku)")
+    parser.add_argument("--no-dedupe", action="store_true",
+                        help="Con --upsert: no aplicar el dedupe implícito por la llave")
+    parser.add_argument("--keep", choices=["first", "last"],
+                        help="Con --dedupe: fila que se conserva (default: first; last con --upsert)")
+    parser.add_argument("--dedupe-mem", type=int, default=DEDUPE_MEM >> 20, metavar="MB",
+                        help=f"Con --dedupe: memoria antes de volcar a disco "
+                             f"(default: {DEDUPE_MEM >> 20} MB, mínimo: {DEDUPE_MIN_MEM} MB)")
+    parser.add_argument("--batch-bytes", type=int, default=BATCH_BYTES,
+                        help=f"Bytes objetivo por INSERT (default: {BATCH_BYTES})")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_SIZE,
+                        help=f"Tope de filas por INSERT (default: {BATCH_SIZE})")
+    parser.add_argument("--upsert", nargs="?", const="sku", metavar="KEY",
+                        help="Emite ON CONFLICT (KEY) DO UPDATE de las demás columnas (KEY default: sku); "
+                             "implica --dedupe KEY --keep last")
+    parser.add_argument("--load", metavar="DSN",
+                        help="Carga el bloque directo en Postgres con COPY FROM STDIN en lugar de generar INSERTs")
+    load_mode = parser.add_mutually_exclusive_group()
+    load_mode.add_argument("--truncate", action="store_true", help="Con --load: TRUNCATE antes de cargar")
+    load_mode.add_argument("--swap", action="store_true",
+                           help="Con --load: carga en <tabla>__staging y la intercambia por RENAME al final")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Procesos para parsear el bloque en paralelo (requiere el índice; default: 1)")
+    parser.add_argument("--no-index", action="store_true",
+                        help=f"No usar ni generar el índice sidecar <dump>{INDEX_SUFFIX}")
+    args = parser.parse_args()
+    if args.dedupe_mem < DEDUPE_MIN_MEM:
+        parser.error(f"--dedupe-mem debe ser al menos {DEDUPE_MIN_MEM} MB")
+    if args.dedupe and args.no_dedupe:
+        parser.error("--dedupe y --no-dedupe son excluyentes")
+    # --upsert no tolera llaves repetidas en un mismo INSERT: se queda la última, como
+    # si las filas se hubieran aplicado una por una (--load usa COPY y no aplica el upsert)
+    if args.upsert and not args.dedupe and not args.no_dedupe and not args.load:
+        args.dedupe = args.upsert
+        args.keep = args.keep or "last"
+    args.keep = args.keep or "first"
+    return args
+
+def main(path: str, table: str = TABLE_TARGET, use_index: bool = True,
+         load_dsn: str = None, load_mode: str = "append", workers: int = 1, output: str = None,
+         upsert_key: str = None, batch_bytes: int = BATCH_BYTES, batch_rows: int = BATCH_SIZE,
+         select=None, where=(), dedupe_key: str = None, keep: str = "first",
+         dedupe_mem: int = DEDUPE_MEM):
+    table = table.lower().split(".")[-1]
+
+    def batching(columns) -> dict:
+        return {
+            "on_conflict": upsert_clause(columns, upsert_key) if upsert_key else "",
+            "batch_bytes": batch_bytes,
+            "batch_rows": batch_rows,
+        }
+
+    # El dedupe es secuencial por naturaleza: con --dedupe no se usa el pool
+    if workers > 1 and use_index and not load_dsn and not dedupe_key and detect_compression(path) is None:
+        block = find_indexed_block(load_or_build_index(path), table)
+        total = 0
+        if block is not None:
+            sel = Selection(block["columns"], select, where)
+            out = open_output(output)
+            try:
+                total = write_values(out, table, sel.out_columns, iter_parallel_tuples(path, block, workers, sel),
+                                     **batching(sel.out_columns))
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+        if not total:
+            sys.stderr.write(f"No se encontró bloque COPY para {table} o no tenía filas.\n")
+        return
+
+    # Lectura perezosa: nunca se carga el dump completo ni la lista de filas
+    f, columns = open_copy_block(path, table, use_index)
+    total = 0
+    if f is not None:
+        with f:
+            sel = Selection(columns, select, where)
+            lines = iter_copy_lines(f, len(columns))
+            stats = {}
+            if dedupe_key:
+                if dedupe_key not in columns:
+                    raise SystemExit(f"ERROR: la columna de dedupe '{dedupe_key}' no está en el bloque COPY")
+                lines = dedupe_lines(lines, columns.index(dedupe_key), keep, dedupe_mem, stats)
+            if load_dsn:
+                total = load_copy_block(load_dsn, table, sel.out_columns, sel.raw_lines(lines), load_mode)
+            else:
+                out = open_output(output)
+                try:
+                    total = write_inserts(out, table, sel.out_columns, sel.rows(lines),
+                                          **batching(sel.out_columns))
+                finally:
+                    if out is not sys.stdout:
+                        out.close()
+            if dedupe_key:
+                sys.stderr.write(f"[INFO] dedupe por {dedupe_key} (keep={keep}): "
+                                 f"{stats.get('dropped', 0)} duplicado(s) descartado(s).\n")
+
+    if not total:
+        sys.stderr.write(f"No se encontró bloque COPY para {table} o no tenía filas.\n")
+        return
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.tables:
+        main_multi(args.dump, [t.strip() for t in args.tables.split(",") if t.strip()], args.out_dir)
+    else:
+        mode = "truncate" if args.truncate else "swap" if args.swap else "append"
+        main(args.dump, args.table, use_index=not args.no_index, load_dsn=args.load, load_mode=mode,
+             workers=args.workers, output=args.output, upsert_key=args.upsert,
+             batch_bytes=args.batch_bytes, batch_rows=args.batch_rows,
+             select=[c.strip() for c in args.columns.split(",")] if args.columns else None,
+             where=[parse_where(w) for w in args.where],
+             dedupe_key=args.dedupe, keep=args.keep, dedupe_mem=args.dedupe_mem << 20)
@@ -1,15 +1,24 @@
 # scripts/combos.py
 # -*- coding: utf-8 -*-
+#
+# Uso:
+#   python scripts/combos.py                        # reemplaza todos los combos del CSV
+#   python scripts/combos.py --diff                 # solo escribe los combos que cambiaron
+#   python scripts/combos.py --diff --deactivate-missing   # + activo=FALSE a los que ya no están
+import argparse
 import os
 import re
 import sys
 from typing import List, Dict, Tuple, Set
 from collections import defaultdict
 
+import numpy as np
 import pandas as pd
 import psycopg2
 from psycopg2.extras import execute_values
 
+from pgcopy import CopyStream, iter_text
+
 # ------------------------------------------------------------
 # Config
 # ------------------------------------------------------------
@@ -39,6 +48,15 @@ BRAND_MAP: Dict[str, str] = {
     "sup": "PROTEINA",
 }
 
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Carga combos y combo_items desde CSV.")
+    p.add_argument("--csv", default=CSV_PATH, help=f"Ruta al CSV (default: {CSV_PATH})")
+    p.add_argument("--diff", action="store_true",
+                   help="Compara contra la BD y solo reescribe combos con items/categoría/marca distintos")
+    p.add_argument("--deactivate-missing", action="store_true",
+                   help="Marca activo=FALSE los combos activos que ya no vienen en el CSV")
+    return p.parse_args()
+
 # ------------------------------------------------------------
 # Lectura CSV
 # ------------------------------------------------------------
@@ -68,13 +86,43 @@ def split_brand_codes(sku_combo: str) -> List[str]:
 # ------------------------------------------------------------
 # Catálogo / BD helpers
 # ------------------------------------------------------------
-def fetch_existing_skus(conn, candidates: Set[str]) -> Set[str]:
-    """ Devuelve los SKU existentes en catalogo_productos (coincidencia exacta). """
+def fetch_existing_skus(conn, candidates: Set[str]) -> Tuple[Set[str], Dict[str, List[str]]]:
+    """
+    Valida los candidatos contra catalogo_productos en el servidor:
+      1) COPY de los tokens a una tabla temporal (ON COMMIT DROP) + ANALYZE
+      2) join por igualdad contra el PK de catalogo_productos -> SKUs existentes
+      3) para los que no existen, variantes por mayúsculas/espacios (lower + sin espacios)
+    Devuelve (existentes, {token: [sku del catálogo que casi coincide, ...]}).
+    """
     if not candidates:
-        return set()
+        return set(), {}
     with conn.cursor() as cur:
-        cur.execute("SELECT sku FROM catalogo_productos WHERE sku = ANY(%s)", (list(candidates),))
-        return {r[0] for r in cur.fetchall()}
+        cur.execute("CREATE TEMP TABLE tmp_sku_candidatos (sku text PRIMARY KEY) ON COMMIT DROP")
+        cur.copy_expert("COPY tmp_sku_candidatos (sku) FROM STDIN",
+                        CopyStream(iter_text((c,) for c in candidates)))
+        cur.execute("ANALYZE tmp_sku_candidatos")
+        cur.execute("""
+            SELECT t.sku
+            FROM tmp_sku_candidatos t
+            JOIN catalogo_productos cp ON cp.sku = t.sku
+        """)
+        valid = {r[0] for r in cur.fetchall()}
+        cur.execute("""
+            WITH faltantes AS (
+                SELECT t.sku, regexp_replace(lower(t.sku), '\\s+', '', 'g') AS k
+                FROM tmp_sku_candidatos t
+                WHERE NOT EXISTS (SELECT 1 FROM catalogo_productos cp WHERE cp.sku = t.sku)
+            )
+            SELECT f.sku, cp.sku
+            FROM faltantes f
+            JOIN catalogo_productos cp ON regexp_replace(lower(cp.sku), '\\s+', '', 'g') = f.k
+            ORDER BY f.sku, cp.sku
+        """)
+        near: Dict[str, List[str]] = defaultdict(list)
+        for token, sku in cur.fetchall():
+            near[token].append(sku)
+        cur.execute("DROP TABLE tmp_sku_candidatos")
+    return valid, dict(near)
 
 def upsert_marcas(conn, codes: Set[str]) -> None:
     if not codes:
@@ -91,8 +139,32 @@ def upsert_marcas(conn, codes: Set[str]) -> None:
 # ------------------------------------------------------------
 # Reglas de parsing (SIN multiplicadores en la misma celda)
 # ------------------------------------------------------------
-def parse_row_pairs(row: pd.Series, sku_cols: List[str], valid_skus: Set[str]) -> Dict[str, int]:
+# Clase de cada celda SKUn, calculada una sola vez para toda la tabla
+K_EMPTY, K_QTY, K_SKU, K_JUNK = 0, 1, 2, 3
+
+def classify_tokens(df: pd.DataFrame, sku_cols: List[str], valid_skus: Set[str]):
+    """
+    Convierte las columnas SKU1..SKUn en una matriz de strings y clasifica cada celda con
+    operaciones vectorizadas: vacía, cantidad (número puro que NO es SKU válido), SKU válido
+    o basura. Devuelve (tokens, kinds, qtys) con forma (filas, columnas); qtys solo tiene
+    valor en las celdas K_QTY.
+    """
+    tokens = df[sku_cols].to_numpy(dtype=object)
+    flat = pd.Series(tokens.ravel(), dtype=object)
+    empty = (flat == "").to_numpy()
+    valid = flat.isin(valid_skus).to_numpy() & ~empty
+    digit = flat.str.isdigit().fillna(False).to_numpy(dtype=bool)
+    kinds = np.select([empty, valid, digit], [K_EMPTY, K_SKU, K_QTY], default=K_JUNK).astype(np.int8)
+
+    qtys = np.zeros(flat.shape[0], dtype=object)
+    is_qty = kinds == K_QTY
+    qtys[is_qty] = [int(t) for t in flat.to_numpy()[is_qty]]
+    shape = tokens.shape
+    return tokens, kinds.reshape(shape), qtys.reshape(shape)
+
+def parse_row_pairs(tokens, kinds, qtys) -> Dict[str, int]:
     """
+    Aplica las reglas secuenciales sobre una fila ya clasificada (ver classify_tokens).
     Reglas EXACTAS:
       - Si la celda siguiente es número puro y NO es un SKU válido: es la cantidad del SKU anterior.
       - Si el mismo SKU aparece varias veces: suma +1 por cada aparición (más la cantidad adyacente si la hay).
@@ -101,39 +173,27 @@ def parse_row_pairs(row: pd.Series, sku_cols: List[str], valid_skus: Set[str]) -
     """
     acc: Dict[str, int] = defaultdict(int)
     prev_sku: str = None
+    n = len(kinds)
 
     i = 0
-    while i < len(sku_cols):
-        token = (row.get(sku_cols[i]) or "").strip()
-        if token == "":
-            prev_sku = None
-            i += 1
-            continue
-
-        # ¿Número puro? => cantidad para el SKU anterior (si NO es SKU válido)
-        if token.isdigit() and token not in valid_skus:
-            if prev_sku:
-                acc[prev_sku] += int(token) - 1  # ya contamos 1 en la celda anterior
-            prev_sku = None
-            i += 1
-            continue
-
-        # ¿Token es SKU válido?
-        if token in valid_skus:
+    while i < n:
+        kind = kinds[i]
+        if kind == K_SKU:
+            token = tokens[i]
             acc[token] += 1
             prev_sku = token
-            # ¿La siguiente celda es número puro y NO SKU válido? => cantidad del actual
-            if i + 1 < len(sku_cols):
-                nxt = (row.get(sku_cols[i + 1]) or "").strip()
-                if nxt.isdigit() and nxt not in valid_skus:
-                    acc[token] += int(nxt) - 1
-                    i += 1  # consumir cantidad
-                    prev_sku = None
-            i += 1
-            continue
-
-        # No número y no SKU válido => ignorar
-        prev_sku = None
+            # ¿La siguiente celda es cantidad? => cantidad del actual
+            if i + 1 < n and kinds[i + 1] == K_QTY:
+                acc[token] += qtys[i + 1] - 1
+                i += 1  # consumir cantidad
+                prev_sku = None
+        elif kind == K_QTY:
+            if prev_sku:
+                acc[prev_sku] += qtys[i] - 1  # ya contamos 1 en la celda anterior
+            prev_sku = None
+        else:
+            # Vacío, o no número y no SKU válido => ignorar
+            prev_sku = None
         i += 1
 
     return {sku: qty for sku, qty in acc.items() if qty >= 1}
@@ -151,86 +211,152 @@ def calc_categoria(pairs: Dict[str, int]) -> str:
     return "compuesto"
 
 # ------------------------------------------------------------
-# Carga fila a fila (cada fila = un combo)
+# Carga en bloque (todo se calcula en memoria y se aplica en 3 sentencias)
 # ------------------------------------------------------------
+def build_combos(df: pd.DataFrame, sku_cols: List[str], valid_skus: Set[str]):
+    """
+    Devuelve ({sku_combo: (codigo_marca, categoria, pairs_valid)}, total_omit, ejemplos_omit).
+    Si un sku_combo se repite en el CSV gana la última fila (igual que la carga fila a fila).
+    """
+    combos: Dict[str, Tuple[str, str, Dict[str, int]]] = {}
+    total_omit = 0
+    ejemplos_omit: Set[str] = set()
+    tokens, kinds, qtys = classify_tokens(df, sku_cols, valid_skus)
+    for sku_combo, t_row, k_row, q_row in zip(df[HEADER_SKU_COMBO].tolist(), tokens, kinds.tolist(), qtys):
+        codes = split_brand_codes(sku_combo)
+        codigo_marca = codes[0]  # primera marca del prefijo
+
+        # Parse con reglas exactas usando valid_skus
+        pairs_all = parse_row_pairs(t_row, k_row, q_row)
+        pairs_valid = {s: q for s, q in pairs_all.items() if s in valid_skus}
+        omitidos    = [(s, q) for s, q in pairs_all.items() if s not in valid_skus]
+
+        combos[sku_combo] = (codigo_marca, calc_categoria(pairs_valid), pairs_valid)
+
+        # Contabiliza omitidos por FK
+        total_omit += len(omitidos)
+        for s, _ in omitidos[:5]:
+            ejemplos_omit.add(s)
+    return combos, total_omit, ejemplos_omit
+
+def apply_combos(conn, combos: Dict[str, Tuple[str, str, Dict[str, int]]]) -> int:
+    """
+    Aplica todos los combos en la transacción abierta:
+      1) un upsert masivo de combos
+      2) un DELETE de combo_items con sku_combo = ANY(...)
+      3) un COPY de todos los combo_items
+    Devuelve el número de combo_items insertados.
+    """
+    if not combos:
+        return 0
+    sql_upsert_combos = """
+        INSERT INTO combos (sku_combo, codigo_marca, titulo, descripcion, activo, categoria)
+        VALUES %s
+        ON CONFLICT (sku_combo) DO UPDATE
+        SET codigo_marca = EXCLUDED.codigo_marca,
+            activo       = EXCLUDED.activo,
+            categoria    = EXCLUDED.categoria
+    """
+    items = [(sku_combo, s, int(q))
+             for sku_combo, (_m, _c, pairs) in combos.items()
+             for s, q in pairs.items()]
+    with conn.cursor() as cur:
+        execute_values(cur, sql_upsert_combos,
+                       [(k, m, c) for k, (m, c, _p) in combos.items()],
+                       template="(%s, %s, NULL, NULL, TRUE, %s)", page_size=5000)
+        cur.execute("DELETE FROM combo_items WHERE sku_combo = ANY(%s)", (list(combos),))
+        if items:
+            cur.copy_expert("COPY combo_items (sku_combo, sku_marca, cantidad) FROM STDIN",
+                            CopyStream(iter_text(items)))
+    return len(items)
+
+def fetch_current_combos(conn, keys: List[str]) -> Dict[str, Tuple[str, str, bool, Dict[str, int]]]:
+    """
+    Estado actual en BD de los sku_combo dados, en una sola consulta:
+      {sku_combo: (codigo_marca, categoria, activo, {sku_marca: cantidad})}
+    """
+    current: Dict[str, Tuple[str, str, bool, Dict[str, int]]] = {}
+    if not keys:
+        return current
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT c.sku_combo, c.codigo_marca, c.categoria, c.activo, ci.sku_marca, ci.cantidad
+            FROM combos c
+            LEFT JOIN combo_items ci ON ci.sku_combo = c.sku_combo
+            WHERE c.sku_combo = ANY(%s)
+            """,
+            (keys,),
+        )
+        for sku_combo, marca, categoria, activo, sku_marca, cantidad in cur:
+            entry = current.setdefault(sku_combo, (marca, categoria, activo, defaultdict(int)))
+            if sku_marca is not None:
+                entry[3][sku_marca] += cantidad
+    return current
+
+def changed_combos(conn, combos: Dict[str, Tuple[str, str, Dict[str, int]]]):
+    """Filtra `combos` dejando los nuevos y los que difieren en marca, categoría, items o activo."""
+    current = fetch_current_combos(conn, list(combos))
+    out = {}
+    for k, (marca, categoria, pairs) in combos.items():
+        cur = current.get(k)
+        if cur is None or cur[:3] != (marca, categoria, True) or dict(cur[3]) != pairs:
+            out[k] = (marca, categoria, pairs)
+    return out
+
+def deactivate_missing(conn, keys: List[str]) -> int:
+    if not keys:
+        return 0
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE combos SET activo = FALSE WHERE activo AND NOT (sku_combo = ANY(%s))",
+            (keys,),
+        )
+        return cur.rowcount
+
 def main():
-    print(f"Leyendo CSV: {CSV_PATH}")
-    df = read_csv_table(CSV_PATH)
+    args = parse_args()
+    print(f"Leyendo CSV: {args.csv}")
+    df = read_csv_table(args.csv)
     sku_cols = [c for c in df.columns if SKU_COL_RE.match(c)]
 
     # Candidatos a validar: TODOS los tokens no vacíos (incluye numéricos, p. ej. 141580)
-    candidates: Set[str] = set()
-    for _, row in df.iterrows():
-        for c in sku_cols:
-            t = (row.get(c) or "").strip()
-            if t:
-                candidates.add(t)
+    candidates: Set[str] = set(pd.unique(df[sku_cols].to_numpy(dtype=object).ravel()))
+    candidates.discard("")
 
     conn = psycopg2.connect(DATABASE_URL)
     try:
         conn.autocommit = False
-        valid_skus = fetch_existing_skus(conn, candidates)
+        valid_skus, near_miss = fetch_existing_skus(conn, candidates)
+        print(f"SKUs candidatos: {len(candidates)} (existentes en catálogo: {len(valid_skus)})")
 
         # Upsert marcas (por prefijos presentes)
         all_codes: Set[str] = set()
-        for _, row in df.iterrows():
-            codes = split_brand_codes(row[HEADER_SKU_COMBO])
-            all_codes.update(codes)
+        for sku_combo in pd.unique(df[HEADER_SKU_COMBO]):
+            all_codes.update(split_brand_codes(sku_combo))
         upsert_marcas(conn, all_codes)
         print(f"Marcas upsertadas: {len(all_codes)}")
 
-        sql_upsert_combo = """
-            INSERT INTO combos (sku_combo, codigo_marca, titulo, descripcion, activo, categoria)
-            VALUES (%s, %s, NULL, NULL, TRUE, %s)
-            ON CONFLICT (sku_combo) DO UPDATE
-            SET codigo_marca = EXCLUDED.codigo_marca,
-                activo       = EXCLUDED.activo,
-                categoria    = EXCLUDED.categoria
-        """
-        sql_delete_items = "DELETE FROM combo_items WHERE sku_combo = %s"
-        sql_insert_items = "INSERT INTO combo_items (sku_combo, sku_marca, cantidad) VALUES %s"
-
-        total_combos = 0
-        total_items  = 0
-        total_omit   = 0
-        ejemplos_omit: Set[str] = set()
-
-        with conn.cursor() as cur:
-            for _, row in df.iterrows():
-                sku_combo = row[HEADER_SKU_COMBO]
-                codes = split_brand_codes(sku_combo)
-                codigo_marca = codes[0]  # primera marca del prefijo
-
-                # Parse con reglas exactas usando valid_skus
-                pairs_all = parse_row_pairs(row, sku_cols, valid_skus)
-                pairs_valid = {s: q for s, q in pairs_all.items() if s in valid_skus}
-                omitidos    = [(s, q) for s, q in pairs_all.items() if s not in valid_skus]
-
-                categoria = calc_categoria(pairs_valid)
-
-                # UPSERT combo
-                cur.execute(sql_upsert_combo, (sku_combo, codigo_marca, categoria))
-                total_combos += 1
-
-                # Reemplazar items
-                cur.execute(sql_delete_items, (sku_combo,))
-                if pairs_valid:
-                    execute_values(cur, sql_insert_items,
-                                   [(sku_combo, s, int(q)) for s, q in pairs_valid.items()])
-                    total_items += len(pairs_valid)
-
-                # Contabiliza omitidos por FK
-                total_omit += len(omitidos)
-                for s, _ in omitidos[:5]:
-                    ejemplos_omit.add(s)
+        combos, total_omit, ejemplos_omit = build_combos(df, sku_cols, valid_skus)
+        to_write = changed_combos(conn, combos) if args.diff else combos
+        total_items = apply_combos(conn, to_write)
+        deactivated = deactivate_missing(conn, list(combos)) if args.deactivate_missing else 0
 
         conn.commit()
-        print(f"Combos procesados: {total_combos}")
+        print(f"Combos procesados: {len(combos)}")
+        if args.diff:
+            print(f"Combos con cambios escritos: {len(to_write)} (sin cambios: {len(combos) - len(to_write)})")
+        if args.deactivate_missing:
+            print(f"Combos desactivados (ya no están en el CSV): {deactivated}")
         print(f"combo_items insertados: {total_items}")
         if total_omit:
             print(f"[AVISO] Items omitidos por FK (SKU no existe): {total_omit}")
             for s in list(ejemplos_omit)[:10]:
                 print(f"  - {s}")
+        if near_miss:
+            print(f"[AVISO] SKUs del CSV que solo coinciden ignorando mayúsculas/espacios: {len(near_miss)}")
+            for token, skus in sorted(near_miss.items())[:20]:
+                print(f"  - {token!r} -> {', '.join(repr(x) for x in skus)}")
         print("✅ PROCESO COMPLETADO (COMMIT).")
 
     except Exception as e:
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Codec del formato COPY texto de PostgreSQL (el que usa pg_dump en los bloques
+'COPY ... FROM stdin;'), compartido por los scripts de respaldos y cargas.
+
+  decode_line("A1\\tTaza\\\\tazul\\t\\\\N")  -> ["A1", "Taza\\tazul", None]
+  encode_row(["A1", "Taza\\tazul", None])  -> "A1\\tTaza\\\\tazul\\t\\\\N"
+
+Decodifica en una sola pasada por campo con un regex + tabla de escapes, y salta
+el regex cuando la línea (o el campo) no trae backslash, que es el caso común.
+Soporta \\b \\f \\n \\r \\t \\v \\\\, octal (\\NNN) y hexadecimal (\\xHH); cualquier otro
+carácter escapado se toma tal cual, igual que el servidor.
+
+También trae el formato binario de COPY (encode_binary_row / iter_binary) y CopyStream,
+el adaptador tipo archivo que consume cursor.copy_expert sin armar el payload completo.
+
+Micro-benchmark (por millón de campos, contra el encadenado de str.replace anterior):
+  python scripts/pgcopy.py
+"""
+
+import re
+import struct
+from decimal import Decimal
+
+NULL = r"\N"
+
+_SIMPLE = {
+    "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v", "\\": "\\",
+}
+
+# \NNN octal, \xH o \xHH hexadecimal, o cualquier carácter escapado
+_ESC_RE = re.compile(r"\\(?:([0-7]{1,3})|x([0-9A-Fa-f]{1,2})|(.))", re.DOTALL)
+
+# Los valores octal/hex se toman como puntos de código: pg_dump solo los emite para
+# caracteres de control ASCII, el texto no-ASCII viaja como UTF-8 crudo.
+def _esc_repl(m) -> str:
+    if m.group(1) is not None:
+        return chr(int(m.group(1), 8))
+    if m.group(2) is not None:
+        return chr(int(m.group(2), 16))
+    c = m.group(3)
+    return _SIMPLE.get(c, c)
+
+_ENCODE_TABLE = str.maketrans({
+    "\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\b": "\\b", "\f": "\\f", "\v": "\\v",
+})
+
+def decode_field(v: str):
+    """Campo COPY -> str (o None para '\\N')."""
+    if v == NULL:
+        return None
+    if "\\" not in v:
+        return v
+    return _ESC_RE.sub(_esc_repl, v)
+
+def decode_line(s: str) -> list:
+    """Línea COPY (sin el salto final) -> lista de valores."""
+    parts = s.split("\t")
+    if "\\" not in s:
+        return parts
+    sub = _ESC_RE.sub
+    return [
+        None if p == NULL else (sub(_esc_repl, p) if "\\" in p else p)
+        for p in parts
+    ]
+
+def encode_field(v) -> str:
+    """Valor -> campo COPY. None -> '\\N'; el resto se convierte con str()."""
+    if v is None:
+        return NULL
+    return str(v).translate(_ENCODE_TABLE)
+
+def encode_row(values) -> str:
+    """Fila -> línea COPY (sin el salto final)."""
+    return "\t".join(encode_field(v) for v in values)
+
+
+# ------------------------------------------------------------
+# COPY binario
+# ------------------------------------------------------------
+BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+BINARY_TRAILER = struct.pack("!h", -1)
+
+_NUMERIC_POS, _NUMERIC_NEG, _NUMERIC_NAN = 0x0000, 0x4000, 0xC000
+
+def _numeric_bin(v) -> bytes:
+    """Decimal/float/int -> representación binaria de numeric (dígitos base 10000)."""
+    d = v if isinstance(v, Decimal) else Decimal(str(v))
+    if d.is_nan():
+        return struct.pack("!hhHh", 0, 0, _NUMERIC_NAN, 0)
+    if d.is_infinite():
+        raise ValueError("numeric no admite infinito en COPY binario")
+    sign, digits, exp = d.as_tuple()
+    s = "".join(map(str, digits))
+    if exp > 0:
+        s += "0" * exp
+        exp = 0
+    dscale = -exp
+    split = len(s) - dscale
+    if split < 0:
+        s, split = "0" * -split + s, 0
+    int_part, frac_part = s[:split], s[split:]
+    int_part = "0" * (-len(int_part) % 4) + int_part
+    frac_part = frac_part + "0" * (-len(frac_part) % 4)
+    groups = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    weight = len(groups) - 1
+    groups += [int(frac_part[i:i + 4]) for i in range(0, len(frac_part), 4)]
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight, sign = 0, 0
+    return struct.pack(f"!hhHh{len(groups)}H", len(groups), weight,
+                       _NUMERIC_NEG if sign else _NUMERIC_POS, dscale, *groups)
+
+def _field_bin(kind: str, v) -> bytes:
+    if v is None:
+        return b"\xff\xff\xff\xff"
+    if kind == "int4":
+        return struct.pack("!ii", 4, int(v))
+    if kind == "int8":
+        return struct.pack("!iq", 8, int(v))
+    if kind == "float8":
+        return struct.pack("!id", 8, float(v))
+    if kind == "numeric":
+        b = _numeric_bin(v)
+    else:  # text y compatibles
+        b = str(v).encode("utf-8")
+    return struct.pack("!i", len(b)) + b
+
+def encode_binary_row(values, kinds) -> bytes:
+    """Fila -> tupla COPY binaria. `kinds` por columna: text | int4 | int8 | float8 | numeric."""
+    return struct.pack("!h", len(kinds)) + b"".join(_field_bin(k, v) for k, v in zip(kinds, values))
+
+def iter_binary(rows, kinds):
+    """Payload completo de COPY ... WITH (FORMAT binary): cabecera, tuplas y trailer."""
+    yield BINARY_HEADER
+    for r in rows:
+        yield encode_binary_row(r, kinds)
+    yield BINARY_TRAILER
+
+def iter_text(rows):
+    """Payload de COPY texto: una línea codificada por fila."""
+    for r in rows:
+        yield (encode_row(r) + "\n").encode("utf-8")
+
+
+class CopyStream:
+    """
+    Adaptador tipo archivo para cursor.copy_expert sobre un iterador de bloques `bytes`
+    (líneas de texto o tuplas binarias). Lee perezosamente y cuenta registros y bytes.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = b""
+        self.records = 0
+        self.bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        parts = [self._buf] if self._buf else []
+        n = len(self._buf)
+        while size < 0 or n < size:
+            b = next(self._chunks, None)
+            if b is None:
+                break
+            parts.append(b)
+            n += len(b)
+            self.records += 1
+        data = b"".join(parts)
+        if size < 0 or n <= size:
+            chunk, self._buf = data, b""
+        else:
+            chunk, self._buf = data[:size], data[size:]
+        self.bytes += len(chunk)
+        return chunk
+
+
+def _bench(n_fields: int = 1_000_000) -> None:
+    import time
+
+    def old_unescape(v: str) -> str:
+        return v.replace(r'\t', '\t').replace(r'\n', '\n').replace(r'\r', '\r').replace(r'\\', '\\')
+
+    def old_line(s: str) -> list:
+        return [None if p == NULL else old_unescape(p) for p in s.split("\t")]
+
+    # Mezcla típica de catalogo_productos: ~1 de cada 10 líneas trae algún escape
+    plain = "SKU-000123\t1\tTaza cerámica 350ml\t\\N\t120.50\t15\tBlanco\tCocina\t0.35\tfoto.jpg"
+    escaped = "SKU-000124\t2\tJuego\\t3 piezas\tLínea 1\\nLínea 2\t99.90\t3\tC:\\\\fotos\tHogar\t1.2\t\\N"
+    per_line = plain.count("\t") + 1
+    lines = ([plain] * 9 + [escaped]) * (n_fields // per_line // 10 + 1)
+
+    for name, fn in (("str.replace x4 (anterior)", old_line), ("pgcopy.decode_line", decode_line)):
+        t0 = time.perf_counter()
+        for s in lines:
+            fn(s)
+        dt = time.perf_counter() - t0
+        fields = len(lines) * per_line
+        print(f"{name:28s} {dt / fields * 1e6:8.3f} s por millón de campos")
+
+
+if __name__ == "__main__":
+    _bench()